@@ -0,0 +1,210 @@
+"""
+captions.py
+
+Burned-in, word-timed captions for the narration track.
+
+Word timings come from Polly speech marks (cached next to the narration mp3) or,
+when those are unavailable, from a simple length-weighted aligner. Every distinct
+word is rasterized once into a word atlas; a single overlay buffer is then
+re-blitted only when the active word changes and blended straight into the
+gameplay frames, so captions cost one small numpy blend per frame instead of one
+text clip per word or an extra masked compositing layer.
+"""
+import os
+import re
+import json
+import time
+from bisect import bisect_right
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageColor
+
+POLLY_MAX_CHARS = 3000
+FALLBACK_FONT = 'images/Roboto-Regular.ttf'
+HIGHLIGHT_COLOR = (255, 221, 0)
+
+
+# Fetch word-level speech marks from Polly, cached as JSON beside the audio
+def fetch_speech_marks(polly, text: str, marks_path: str, voice_id: str):
+    if os.path.exists(marks_path):
+        with open(marks_path, 'r', encoding='utf-8') as f:
+            return [tuple(w) for w in json.load(f)]
+    # Marks are only aligned with the audio for single-request narration
+    if len(text) > POLLY_MAX_CHARS:
+        return None
+    resp = polly.synthesize_speech(
+        Text=text,
+        OutputFormat='json',
+        SpeechMarkTypes=['word'],
+        VoiceId=voice_id
+    )
+    marks = []
+    for line in resp['AudioStream'].read().decode('utf-8').splitlines():
+        if line.strip():
+            mark = json.loads(line)
+            marks.append((mark['time'] / 1000.0, mark['value']))
+    with open(marks_path, 'w', encoding='utf-8') as f:
+        json.dump(marks, f)
+    return marks
+
+
+# Forced-aligner stand-in: spread words over the narration by spoken length
+def estimate_word_marks(text: str, duration: float):
+    words = text.split()
+    if not words:
+        return []
+    # letters take time, sentence/clause ends add a pause
+    weights = []
+    for w in words:
+        weight = len(w) + 1
+        if w[-1] in '.!?':
+            weight += 6
+        elif w[-1] in ',;:':
+            weight += 3
+        weights.append(weight)
+    scale = duration / sum(weights)
+    marks, t = [], 0.0
+    for w, weight in zip(words, weights):
+        marks.append((t, w))
+        t += weight * scale
+    return marks
+
+
+def load_caption_font(style: dict):
+    size = int(style.get('body_size', 45))
+    for path in (style.get('font'), FALLBACK_FONT):
+        if not path:
+            continue
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+# Rasterize each distinct word once into an alpha coverage map
+def build_word_atlas(words, font, max_width: int):
+    atlas = {}
+    probe = ImageDraw.Draw(Image.new('L', (1, 1)))
+    ascent, descent = font.getmetrics()
+    line_h = ascent + descent
+    for w in set(words):
+        left, _, right, _ = probe.textbbox((0, 0), w, font=font)
+        img = Image.new('L', (max(1, right - min(left, 0)), line_h), 0)
+        ImageDraw.Draw(img).text((-min(left, 0), 0), w, font=font, fill=255)
+        atlas[w] = np.asarray(img, dtype=np.float32)[:, :max_width] / 255.0
+    return atlas, line_h
+
+
+# Group consecutive words into on-screen phrases that fit the overlay width
+def group_phrases(words, atlas, max_width: int, space_w: int, max_words: int):
+    phrases, cur, cur_w = [], [], 0
+    for i, w in enumerate(words):
+        w_w = atlas[w].shape[1]
+        needed = w_w if not cur else cur_w + space_w + w_w
+        if cur and (len(cur) >= max_words or needed > max_width):
+            phrases.append(cur)
+            cur, needed = [], w_w
+        cur.append(i)
+        cur_w = needed
+        if re.search(r'[.!?]["\')\]]*$', w):
+            phrases.append(cur)
+            cur, cur_w = [], 0
+    if cur:
+        phrases.append(cur)
+    return phrases
+
+
+class CaptionOverlay:
+    """Single reusable RGBA caption band redrawn from the word atlas on word changes.
+
+    `rgb` holds straight (not premultiplied) color and `alpha` the band's opacity;
+    `blend` composites the active phrase box straight onto a video frame.
+    `render_seconds` covers overlay setup plus every per-frame blend.
+    """
+
+    def __init__(self, marks, video_size, style: dict, max_words: int = 3, pad: int = 16):
+        setup_start = time.perf_counter()
+        vid_w, vid_h = video_size
+        self.font = load_caption_font(style)
+        self.words = [w for _, w in marks]
+        self.starts = [t for t, _ in marks]
+        self.pad = pad
+        self.width = int(vid_w * 0.9)
+        self.atlas, self.line_h = build_word_atlas(self.words, self.font, self.width - 2 * pad)
+        self.space_w = max(1, int(self.font.getlength(' ')))
+        self.color = np.array(ImageColor.getrgb(style.get('text_color', 'white'))[:3], dtype=np.float32)
+        self.highlight = np.array(HIGHLIGHT_COLOR, dtype=np.float32)
+        self.bg_opacity = float(style.get('bg_opacity', 0.6))
+
+        self.height = self.line_h + 2 * pad
+        phrases = group_phrases(self.words, self.atlas, self.width - 2 * pad, self.space_w, max_words)
+        self.phrase_of = [0] * len(self.words)
+        for p_idx, idxs in enumerate(phrases):
+            for i in idxs:
+                self.phrase_of[i] = p_idx
+        self.phrases = phrases
+
+        # Band position on the frame, kept fully inside it
+        self.x = (vid_w - self.width) // 2
+        self.y = min(int(vid_h * float(style.get('caption_y', 0.7))), vid_h - self.height)
+
+        self.rgb = np.zeros((self.height, self.width, 3), dtype=np.float32)
+        self.alpha = np.zeros((self.height, self.width), dtype=np.float32)
+        self._box = (0, 0)  # columns of the band covered by the current phrase box
+        self._active = None
+        self.render_seconds = time.perf_counter() - setup_start
+
+    def _redraw(self, word_idx):
+        self.rgb.fill(0)
+        self.alpha.fill(0)
+        self._box = (0, 0)
+        if word_idx is None:
+            return
+        idxs = self.phrases[self.phrase_of[word_idx]]
+        widths = [self.atlas[self.words[i]].shape[1] for i in idxs]
+        text_w = sum(widths) + self.space_w * (len(idxs) - 1)
+        x = (self.width - text_w) // 2
+        # translucent black backing box behind the phrase
+        bx0, bx1 = max(0, x - self.pad), min(self.width, x + text_w + self.pad)
+        self.alpha[:, bx0:bx1] = self.bg_opacity
+        self._box = (bx0, bx1)
+        # accumulate premultiplied color (text over black box), then un-premultiply
+        y = self.pad
+        for i, w_w in zip(idxs, widths):
+            cov = self.atlas[self.words[i]]
+            color = self.highlight if i == word_idx else self.color
+            region = self.rgb[y:y + self.line_h, x:x + w_w]
+            region *= (1.0 - cov)[:, :, None]
+            region += color * cov[:, :, None]
+            a = self.alpha[y:y + self.line_h, x:x + w_w]
+            a += (1.0 - a) * cov
+            x += w_w + self.space_w
+        box_a = self.alpha[:, bx0:bx1]
+        self.rgb[:, bx0:bx1] /= np.maximum(box_a, 1e-6)[:, :, None]
+
+    def blend(self, frame, t):
+        start = time.perf_counter()
+        idx = bisect_right(self.starts, t) - 1
+        word_idx = idx if idx >= 0 else None
+        if word_idx != self._active:
+            self._active = word_idx
+            self._redraw(word_idx)
+        bx0, bx1 = self._box
+        if bx1 > bx0:
+            if not frame.flags.writeable:
+                frame = frame.copy()
+            # only the phrase box is touched, in float32
+            dst = frame[self.y:self.y + self.height, self.x + bx0:self.x + bx1]
+            a = self.alpha[:, bx0:bx1, None]
+            out = dst.astype(np.float32)
+            out += (self.rgb[:, bx0:bx1] - out) * a
+            np.copyto(dst, out, casting='unsafe')
+        self.render_seconds += time.perf_counter() - start
+        return frame
+
+
+# Burn captions into `clip` by blending the caption band into each frame in place
+def add_captions(clip, marks, style: dict):
+    overlay = CaptionOverlay(marks, clip.size, style)
+    return clip.fl(lambda gf, t: overlay.blend(gf(t), t)), overlay
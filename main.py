@@ -7,10 +7,13 @@ with lofi music and AI narration (cached). Displays a story card overlay for the
 """
 import os
 import random
+import argparse
+import time
 import yaml
 from dotenv import load_dotenv
 import praw
 import boto3
+from botocore.exceptions import BotoCoreError, ClientError
 from PIL import Image
 # Patch PIL.Image.ANTIALIAS for compatibility
 if not hasattr(Image, 'ANTIALIAS'):
@@ -27,7 +30,10 @@ from moviepy.editor import (
     ImageClip,
     CompositeVideoClip
 )
-from story_card import create_story_card
+from story_card import create_story_cards
+from story_corpus import StoryCorpus
+from captions import fetch_speech_marks, estimate_word_marks, add_captions
+from render_queue import JobQueue, run_worker
 
 # Configuration
 VIDEOS_FOLDER = 'videos'
@@ -37,7 +43,19 @@ OUTPUT_FOLDER = 'output'
 MAX_TOTAL_DURATION = 180  # seconds
 CARD_DURATION = 5         # seconds overlay duration
 CARD_SCALE = 0.75         # scale relative to video resolution
+CARD_CANVAS = (1080, 1920)  # canvas the story card is laid out on
 PROCESSED_FILE = 'processed_posts.txt'
+CARD_OPTIONS = dict(
+    username="reddit_post_finder",
+    avatar_path="images/reddit_avatr.png",
+    is_verified=True,
+    verified_icon_path="icon_verified_blue.png",
+    reward_paths=["images/reddit_gold.png", "images/reddit_platinum.png"],
+    heart_icon_path="images/heart-icon.png",
+    comment_icon_path="images/comment-icon.png",
+    font_path="images/Roboto-Regular.ttf"
+)
+CORPUS_DB = 'story_corpus.db'
 
 # Load YAML config
 def load_config(path='config.yml') -> dict:
@@ -45,29 +63,40 @@ def load_config(path='config.yml') -> dict:
     with open(path, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
 
-# Updated get_reddit_posts to take processed_ids
-def get_reddit_posts(reddit, subs, max_posts, min_upvotes, processed_ids):
+# Updated get_reddit_posts to take processed_ids and screen reposts against the corpus
+def get_reddit_posts(reddit, subs, max_posts, min_upvotes, processed_ids, corpus=None):
     posts = []
     for sub in subs:
         for submission in reddit.subreddit(sub).top('week', limit=max_posts * 3):
             if submission.score >= min_upvotes \
                and not submission.stickied \
                and submission.id not in processed_ids:
+                if corpus is not None:
+                    corpus.add(submission.id, sub, submission.title, submission.selftext, submission.score)
+                    # posts picked earlier in this run count too, so in-run reposts are caught
+                    dup = corpus.find_duplicate(submission.id, submission.title, submission.selftext,
+                                                selected=[p.id for p in posts])
+                    if dup:
+                        print(f"Skipping {submission.id}: near-duplicate of {dup}")
+                        continue
                 posts.append(submission)
                 if len(posts) >= max_posts:
                     return posts
     return posts
 
-# Synthesize speech with caching and manage Polly limits
-def synthesize_speech(text: str, out_path: str):
-    if os.path.exists(out_path):
-        return
-    polly = boto3.client(
+def get_polly_client():
+    return boto3.client(
         'polly',
         region_name=os.getenv('AWS_REGION'),
         aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
         aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
     )
+
+# Synthesize speech with caching and manage Polly limits
+def synthesize_speech(text: str, out_path: str):
+    if os.path.exists(out_path):
+        return
+    polly = get_polly_client()
     max_chars = 3000
     def _synth(chunk, fname):
         resp = polly.synthesize_speech(Text=chunk, OutputFormat='mp3', VoiceId=os.getenv('AWS_POLLY_VOICE'))
@@ -138,9 +167,112 @@ def save_processed_post(post_id):
     with open(PROCESSED_FILE, 'a', encoding='utf-8') as f:
         f.write(post_id + '\n')
 
-# Main execution
-def main():
-    cfg = load_config()
+# Story cards as in-memory (RGBA crop, offset) pairs, one per title
+def render_story_cards(titles, workers=None):
+    return create_story_cards(
+        titles=titles,
+        video_size=CARD_CANVAS,
+        like_counts=["99+"] * len(titles),
+        comment_counts=["99+"] * len(titles),
+        workers=workers,
+        **CARD_OPTIONS
+    )
+
+# Build the composited clip (gameplay, narration, story card, captions) for one post
+def build_post_clip(cfg, post_id: str, subreddit: str, title: str, selftext: str, card=None):
+    style = cfg.get('style', {})
+    os.makedirs(AUDIO_CACHE, exist_ok=True)
+    # Generate story card overlay in memory unless the caller batched it already
+    if card is None:
+        card = render_story_cards([title], workers=1)[0]
+    # Synthesize narration
+    text = title + ("\n\n" + selftext if selftext else "")
+    mp3_path = os.path.join(AUDIO_CACHE, f"{subreddit}_{post_id}.mp3")
+    synthesize_speech(text, mp3_path)
+    # bump the AI narration up by ~20%
+    narration = AudioFileClip(mp3_path).volumex(1.2)
+
+    # Prepare gameplay and audio
+    gameplay = pick_gameplay_clip(narration.duration)
+    # gameplay = gameplay.resize(tuple(cfg['tiktok']['resolution']))
+    
+     # 2) Center-crop to 9:16, preserving as much content as possible:
+    from moviepy.video.fx.all import crop
+    w, h     = gameplay.size
+    Tw, Th   = cfg['tiktok']['resolution']  # (1080, 1920)
+    # If clip is too wide, crop horizontally:
+    if (w / h) > (Tw / Th):
+        new_w = int(h * Tw / Th)
+        x1 = (w - new_w) // 2
+        x2 = x1 + new_w
+        gameplay = crop(gameplay, x1=x1, x2=x2)
+    else:
+    # Otherwise crop vertically:
+        new_h = int(w * Th / Tw)
+        y1 = (h - new_h) // 2
+        y2 = y1 + new_h
+        gameplay = crop(gameplay, y1=y1, y2=y2)
+
+    # 3) Finally resize your crop to exactly TikTok size:
+    gameplay = gameplay.resize((Tw, Th))
+
+    music_list = [os.path.join(MUSIC_FOLDER, f) for f in os.listdir(MUSIC_FOLDER) if f.lower().endswith(('.mp4','.mp3'))]
+    bg_audio = AudioFileClip(random.choice(music_list)).audio_loop(duration=narration.duration).volumex(0.10)
+    combined_audio = CompositeAudioClip([bg_audio, narration])
+    # Create overlay clip
+    card_img, (card_x, card_y) = card
+    card_clip = ImageClip(card_img, transparent=True)
+    vid_w, vid_h = gameplay.size
+
+    card_clip = card_clip.set_duration(CARD_DURATION)
+    # scale the card canvas to 75% of video size, centered; the card is a crop of it
+    canvas_w, canvas_h = CARD_CANVAS
+    scale = int(vid_h * CARD_SCALE) / canvas_h
+    card_clip = card_clip.resize(scale)
+    card_clip = card_clip.set_position((
+        int((vid_w - canvas_w * scale) / 2 + card_x * scale),
+        int((vid_h - canvas_h * scale) / 2 + card_y * scale)
+    ))
+    base = gameplay.set_audio(combined_audio)
+    overlay = None
+    # Word-timed captions from Polly speech marks, else estimated timings
+    if style.get('captions', True):
+        marks_path = mp3_path.replace('.mp3', '_marks.json')
+        try:
+            marks = fetch_speech_marks(get_polly_client(), text, marks_path, os.getenv('AWS_POLLY_VOICE'))
+        except (BotoCoreError, ClientError) as e:
+            print(f"Warning: could not fetch speech marks for {post_id}, estimating timings: {e}")
+            marks = None
+        marks = marks or estimate_word_marks(text, narration.duration)
+        # burned into the gameplay frames, so they stay under the story card
+        base, overlay = add_captions(base, marks, style)
+    # Composite gameplay under card overlay
+    return CompositeVideoClip([base, card_clip], size=(vid_w, vid_h)), overlay
+
+def report_caption_cost(caption_overlays, render_time: float):
+    if caption_overlays and render_time > 0:
+        caption_time = sum(o.render_seconds for o in caption_overlays)
+        print(f"Captions: {caption_time:.2f}s of {render_time:.2f}s render ({100 * caption_time / render_time:.1f}%)")
+
+# Backfill the corpus with posts rendered before it existed so their reposts are caught
+def seed_corpus(reddit, corpus, processed_ids):
+    missing = corpus.missing_ids(sorted(processed_ids))
+    if not missing:
+        return
+    print(f"Seeding story corpus with {len(missing)} processed post(s)")
+    for submission in reddit.info(fullnames=[f"t3_{pid}" for pid in missing]):
+        corpus.add(submission.id, submission.subreddit.display_name, submission.title,
+                   submission.selftext, submission.score)
+        corpus.mark_used(submission.id)
+
+# Flag stories as used once they have been rendered or handed to the queue
+def mark_stories_used(cfg, post_ids):
+    corpus = StoryCorpus(CORPUS_DB, threshold=cfg.get('dedup_threshold', 0.8))
+    for post_id in post_ids:
+        corpus.mark_used(post_id)
+    corpus.close()
+
+def fetch_new_posts(cfg):
     reddit = praw.Reddit(
         client_id=os.getenv('REDDIT_CLIENT_ID'),
         client_secret=os.getenv('REDDIT_CLIENT_SECRET'),
@@ -149,74 +281,96 @@ def main():
         user_agent='TikTokVideoGen/1.0'
     )
     processed = load_processed_posts()
-    posts = get_reddit_posts(reddit, cfg['subreddits'], cfg['max_posts_per_run'], cfg['min_upvotes'], processed)
-    os.makedirs(AUDIO_CACHE, exist_ok=True)
-    final_clips = []
+    corpus = StoryCorpus(CORPUS_DB, threshold=cfg.get('dedup_threshold', 0.8))
+    seed_corpus(reddit, corpus, processed)
+    posts = get_reddit_posts(reddit, cfg['subreddits'], cfg['max_posts_per_run'], cfg['min_upvotes'], processed, corpus)
+    corpus.close()
+    return posts
+
+# Push one render job per post onto the shared queue
+def enqueue_posts(cfg, queue_path: str):
+    queue = JobQueue(queue_path)
+    posts = fetch_new_posts(cfg)
     for post in posts:
-        # Generate story card overlay
-        card_path = os.path.join(AUDIO_CACHE, f"{post.id}_card.png")
-        create_story_card(
-            username="reddit_post_finder",
-            title=post.title,
-            avatar_path="images/reddit_avatr.png",
-            is_verified=True,
-            verified_icon_path="icon_verified_blue.png",
-            reward_paths=["images/reddit_gold.png", "images/reddit_platinum.png"],
-            heart_icon_path="images/heart-icon.png",
-            comment_icon_path="images/comment-icon.png",
-            like_count="99+",
-            comment_count="99+",
-            font_path="images/Roboto-Regular.ttf",
-            output_path=card_path
-        )
-        # Synthesize narration
-        text = post.title + ("\n\n" + post.selftext if post.selftext else "")
-        mp3_path = os.path.join(AUDIO_CACHE, f"{post.subreddit.display_name}_{post.id}.mp3")
-        synthesize_speech(text, mp3_path)
-        # bump the AI narration up by ~20%
-        narration = AudioFileClip(mp3_path).volumex(1.2)
-
-        # Prepare gameplay and audio
-        gameplay = pick_gameplay_clip(narration.duration)
-        # gameplay = gameplay.resize(tuple(cfg['tiktok']['resolution']))
-        
-         # 2) Center-crop to 9:16, preserving as much content as possible:
-        from moviepy.video.fx.all import crop
-        w, h     = gameplay.size
-        Tw, Th   = cfg['tiktok']['resolution']  # (1080, 1920)
-        # If clip is too wide, crop horizontally:
-        if (w / h) > (Tw / Th):
-            new_w = int(h * Tw / Th)
-            x1 = (w - new_w) // 2
-            x2 = x1 + new_w
-            gameplay = crop(gameplay, x1=x1, x2=x2)
-        else:
-        # Otherwise crop vertically:
-            new_h = int(w * Th / Tw)
-            y1 = (h - new_h) // 2
-            y2 = y1 + new_h
-            gameplay = crop(gameplay, y1=y1, y2=y2)
-
-        # 3) Finally resize your crop to exactly TikTok size:
-        gameplay = gameplay.resize((Tw, Th))
-
-        music_list = [os.path.join(MUSIC_FOLDER, f) for f in os.listdir(MUSIC_FOLDER) if f.lower().endswith(('.mp4','.mp3'))]
-        bg_audio = AudioFileClip(random.choice(music_list)).audio_loop(duration=narration.duration).volumex(0.10)
-        combined_audio = CompositeAudioClip([bg_audio, narration])
-        # Create overlay clip
-        card_clip = ImageClip(card_path)
-        vid_w, vid_h = gameplay.size
-
-        card_clip = card_clip.set_duration(CARD_DURATION)
-        # scale to 75% of video size
-        card_clip = card_clip.resize(height=int(vid_h * CARD_SCALE))
-        card_clip = card_clip.set_position(('center','center'))
-        # Composite gameplay under card overlay
-        comp = CompositeVideoClip([gameplay.set_audio(combined_audio), card_clip], size=(vid_w, vid_h))
+        payload = {
+            'subreddit': post.subreddit.display_name,
+            'title': post.title,
+            'selftext': post.selftext,
+        }
+        if queue.enqueue(post.id, payload):
+            print(f"Queued {post.id}")
+        save_processed_post(post.id)
+    mark_stories_used(cfg, [post.id for post in posts])
+    print(f"Queue status: {queue.counts()}")
+    queue.close()
+
+# Render a single queued post into the shared output directory
+def render_job(cfg, post_id: str, payload: dict, out_dir: str):
+    comp, overlay = build_post_clip(cfg, post_id, payload['subreddit'], payload['title'], payload['selftext'])
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, f"{payload['subreddit']}_{post_id}.mp4")
+    # write under a temp name so other nodes never see a half-written video
+    tmp_path = os.path.join(out_dir, f".{post_id}.{os.getpid()}.tmp.mp4")
+    render_start = time.perf_counter()
+    try:
+        comp.write_videofile(tmp_path, fps=cfg['tiktok']['frame_rate'], codec='libx264', audio_codec='aac')
+        os.replace(tmp_path, out_path)
+    except Exception:
+        # don't leave partial files behind in the shared output directory
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    report_caption_cost([overlay] if overlay else [], time.perf_counter() - render_start)
+    return {'output': out_path}
+
+def run_render_worker(cfg, queue_path: str, out_dir: str, lease_seconds: float, exit_when_empty: bool):
+    queue = JobQueue(queue_path)
+    # each job draws its own story card; that takes milliseconds next to a render
+    done = run_worker(
+        queue,
+        lambda job_id, payload: render_job(cfg, job_id, payload, out_dir),
+        lease_seconds=lease_seconds,
+        exit_when_empty=exit_when_empty
+    )
+    print(f"Worker finished {done} job(s); queue status: {queue.counts()}")
+    queue.close()
+
+# Main execution
+def main():
+    cfg = load_config()
+    worker_cfg = cfg.get('worker', {})
+    parser = argparse.ArgumentParser(description='Generate TikTok videos from Reddit stories')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--enqueue', action='store_true', help='fetch posts and add them to the render queue')
+    mode.add_argument('--worker', action='store_true', help='render jobs claimed from the render queue')
+    parser.add_argument('--queue', default=worker_cfg.get('queue_path', 'render_queue.db'), help='path to the shared queue file')
+    parser.add_argument('--output', default=worker_cfg.get('output_dir', OUTPUT_FOLDER), help='shared output directory for worker renders')
+    parser.add_argument('--lease', type=float, default=worker_cfg.get('lease_seconds', 600), help='job lease length in seconds')
+    parser.add_argument('--forever', action='store_true', help='keep polling for jobs instead of exiting when the queue is empty')
+    args = parser.parse_args()
+
+    if args.enqueue:
+        enqueue_posts(cfg, args.queue)
+        return
+    if args.worker:
+        run_render_worker(cfg, args.queue, args.output, args.lease, not args.forever)
+        return
+
+    posts = fetch_new_posts(cfg)
+    cards = render_story_cards([post.title for post in posts])
+    final_clips = []
+    caption_overlays = []
+    for post, card in zip(posts, cards):
+        comp, overlay = build_post_clip(cfg, post.id, post.subreddit.display_name, post.title, post.selftext, card)
         final_clips.append(comp)
+        if overlay:
+            caption_overlays.append(overlay)
         save_processed_post(post.id)
     # Split and write
+    render_start = time.perf_counter()
     split_and_write_clips(final_clips, MAX_TOTAL_DURATION, OUTPUT_FOLDER, cfg['tiktok']['frame_rate'])
+    report_caption_cost(caption_overlays, time.perf_counter() - render_start)
+    mark_stories_used(cfg, [post.id for post in posts])
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,190 @@
+"""
+render_queue.py
+
+Lease-based render job queue backed by a SQLite file, so any number of worker
+processes or machines pointing at the same file (e.g. on shared storage) can
+split the rendering work.
+
+A worker claims a pending job together with a time-limited lease and keeps it
+alive with a heartbeat while rendering. If the worker dies the lease runs out and
+the next claim picks the job up again. Claims run inside BEGIN IMMEDIATE so two
+workers can never take the same job.
+
+Note: the rollback journal is used instead of WAL because WAL needs shared memory
+and does not work across machines on network filesystems.
+"""
+import json
+import time
+import socket
+import sqlite3
+import threading
+import os
+
+MAX_ATTEMPTS = 3
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class JobQueue:
+    def __init__(self, path: str = 'render_queue.db', timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self.conn = self._connect()
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    created REAL NOT NULL
+                )
+            """)
+            self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)')
+
+    def _connect(self):
+        # autocommit mode so transactions are opened explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+
+    def close(self):
+        self.conn.close()
+
+    # Add a job; returns False if a job with this id was already queued
+    def enqueue(self, job_id: str, payload: dict) -> bool:
+        cur = self.conn.execute(
+            'INSERT OR IGNORE INTO jobs (id, payload, created) VALUES (?, ?, ?)',
+            (job_id, json.dumps(payload), time.time())
+        )
+        return cur.rowcount == 1
+
+    # Claim the oldest pending job or one whose lease has expired
+    def claim(self, worker_id: str, lease_seconds: float):
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            # jobs that keep killing their workers stop being handed out
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed' WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, MAX_ATTEMPTS)
+            )
+            row = self.conn.execute(
+                "SELECT id, payload FROM jobs "
+                "WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) AND attempts < ? "
+                "ORDER BY created LIMIT 1",
+                (now, MAX_ATTEMPTS)
+            ).fetchone()
+            if row is None:
+                self.conn.execute('COMMIT')
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now + lease_seconds, row[0])
+            )
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return row[0], json.loads(row[1])
+
+    # Extend a lease; returns False if the job was reclaimed by another worker
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float, conn=None) -> bool:
+        cur = (conn or self.conn).execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            (time.time() + lease_seconds, job_id, worker_id)
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result=None) -> bool:
+        cur = self.conn.execute(
+            "UPDATE jobs SET status = 'done', lease_expires = NULL, result = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            (json.dumps(result), job_id, worker_id)
+        )
+        return cur.rowcount == 1
+
+    # Release a failed job for retry, or park it as failed after MAX_ATTEMPTS
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        cur = self.conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "lease_expires = NULL, result = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            (MAX_ATTEMPTS, json.dumps({'error': error}), job_id, worker_id)
+        )
+        return cur.rowcount == 1
+
+    def counts(self) -> dict:
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def has_open_jobs(self) -> bool:
+        row = self.conn.execute("SELECT 1 FROM jobs WHERE status IN ('pending', 'leased') LIMIT 1").fetchone()
+        return row is not None
+
+
+class LeaseHeartbeat:
+    """Renews a job lease from a background thread while the job is being rendered."""
+
+    def __init__(self, queue: JobQueue, job_id: str, worker_id: str, lease_seconds: float):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        # sqlite connections can't be shared between threads
+        conn = self.queue._connect()
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                try:
+                    renewed = self.queue.renew(self.job_id, self.worker_id, self.lease_seconds, conn=conn)
+                except sqlite3.Error as e:
+                    # e.g. "database is locked" with many nodes on one file; retry next tick
+                    print(f"[{self.worker_id}] could not renew lease on {self.job_id}, retrying: {e}")
+                    continue
+                if not renewed:
+                    self.lost = True
+                    return
+        finally:
+            conn.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# Claim and run jobs one at a time until the queue is drained (or forever when
+# exit_when_empty is False). Claiming one job at a time keeps the work spread across nodes.
+def run_worker(queue: JobQueue, handler, worker_id: str = None, lease_seconds: float = 600,
+               poll_interval: float = 5.0, exit_when_empty: bool = True):
+    worker_id = worker_id or default_worker_id()
+    done = 0
+    while True:
+        job = queue.claim(worker_id, lease_seconds)
+        if job is None:
+            # other workers may still hand jobs back through expired leases
+            if exit_when_empty and not queue.has_open_jobs():
+                return done
+            time.sleep(poll_interval)
+            continue
+        job_id, payload = job
+        print(f"[{worker_id}] rendering {job_id}")
+        try:
+            with LeaseHeartbeat(queue, job_id, worker_id, lease_seconds) as hb:
+                result = handler(job_id, payload)
+        except Exception as e:
+            print(f"[{worker_id}] job {job_id} failed: {e}")
+            queue.fail(job_id, worker_id, str(e))
+            continue
+        if hb.lost or not queue.complete(job_id, worker_id, result):
+            print(f"[{worker_id}] lease on {job_id} was lost; result left to the new owner")
+            continue
+        done += 1
@@ -0,0 +1,91 @@
+# render_queue_test.py
+# Standalone script: run several worker processes against one queue file and check
+# that every job is rendered exactly once, including one whose lease was abandoned,
+# and that a job which keeps failing ends up 'failed'.
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+import multiprocessing
+
+from render_queue import JobQueue, run_worker, MAX_ATTEMPTS
+
+LEASE_SECONDS = 2
+POISON_JOB = 'poison'
+
+
+def dummy_handler(out_dir, job_id, payload):
+    if job_id == POISON_JOB:
+        raise RuntimeError('this job always fails')
+    time.sleep(0.02)
+    # one line per time the job body actually ran
+    with open(os.path.join(out_dir, job_id), 'a', encoding='utf-8') as f:
+        f.write(f"{os.getpid()}\n")
+    return {'output': job_id}
+
+
+def worker_process(queue_path, out_dir):
+    queue = JobQueue(queue_path)
+    run_worker(
+        queue,
+        lambda job_id, payload: dummy_handler(out_dir, job_id, payload),
+        lease_seconds=LEASE_SECONDS,
+        poll_interval=0.2
+    )
+    queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-process render queue check')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--jobs', type=int, default=40)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='render_queue_test_')
+    queue_path = os.path.join(tmp, 'queue.db')
+    out_dir = os.path.join(tmp, 'output')
+    os.makedirs(out_dir)
+
+    queue = JobQueue(queue_path)
+    job_ids = [f"job{i}" for i in range(args.jobs)]
+    for job_id in job_ids:
+        queue.enqueue(job_id, {'n': job_id})
+    queue.enqueue(POISON_JOB, {})
+
+    # A worker that claims the oldest job and dies without completing it
+    abandoned = queue.claim('crashed-worker', LEASE_SECONDS)
+    print(f"Abandoned lease on {abandoned[0]}")
+
+    procs = [multiprocessing.Process(target=worker_process, args=(queue_path, out_dir)) for _ in range(args.workers)]
+    start = time.time()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    print(f"{args.workers} workers finished in {time.time() - start:.1f}s")
+
+    rows = dict(queue.conn.execute('SELECT id, status FROM jobs').fetchall())
+    attempts = queue.conn.execute('SELECT attempts FROM jobs WHERE id = ?', (POISON_JOB,)).fetchone()[0]
+    queue.close()
+
+    failures = []
+    for job_id in job_ids:
+        path = os.path.join(out_dir, job_id)
+        runs = open(path, encoding='utf-8').read().split() if os.path.exists(path) else []
+        if rows[job_id] != 'done' or len(runs) != 1:
+            failures.append(f"{job_id}: status={rows[job_id]} runs={len(runs)}")
+    if rows[POISON_JOB] != 'failed' or attempts != MAX_ATTEMPTS:
+        failures.append(f"{POISON_JOB}: status={rows[POISON_JOB]} attempts={attempts}")
+
+    if failures:
+        print("FAILED:")
+        for f in failures:
+            print(f"  {f}")
+        sys.exit(1)
+    print(f"OK: {len(job_ids)} jobs done exactly once, '{POISON_JOB}' failed after {attempts} attempts")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,52 +1,24 @@
 from PIL import Image, ImageDraw, ImageFont, ImageOps
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import textwrap, os, sys
 
-def create_story_card(
-    username: str,
-    title: str,
-    video_size=(1080, 1920),
-    card_size=(800, 600),
-    padding=30,
-    # Avatar / verified
-    avatar_path: str = None,
-    avatar_size=80,
-    is_verified: bool = False,
-    verified_icon_path: str = None,
-    verified_icon_size=40,
-    # Awards (gold/silver/etc)
-    reward_paths: list = None,
-    reward_size=40,
-    reward_spacing=10,
-    # Bottom stats
-    like_count: str = "0",
-    comment_count: str = "0",
-    heart_icon_path: str = None,
-    comment_icon_path: str = None,
-    stat_icon_size=30,
-    stat_spacing=10,
-    stat_text_padding=5,
-    # Fonts
-    font_path="arial.ttf",
-    username_font_size=50,
-    title_font_size=36,
-    stat_font_size=28,
-    # Output
-    output_path="story_card_full.png"
-):
-    W, H = video_size
-    CW, CH = card_size
-    x0 = (W - CW) // 2
-    y0 = (H - CH) // 4
+def _load_stat_icon(path, size, label):
+    if path and os.path.exists(path):
+        try:
+            return Image.open(path).convert("RGBA").resize((size,size), Image.LANCZOS)
+        except Exception as e:
+            print(f"Warning: could not load {label} icon '{path}': {e}", file=sys.stderr)
+    return None
 
-    # Create canvas + rounded white card
-    base = Image.new("RGBA", (W, H), (0,0,0,0))
-    draw = ImageDraw.Draw(base)
+# Static part of the card: background, avatar, username, badges, heart icon
+def _draw_card_base(base, draw, username, x0, y0, CW, CH, padding,
+                    avatar_path, avatar_size, is_verified, verified_icon_path, verified_icon_size,
+                    reward_paths, reward_size, reward_spacing, heart_icon, stat_icon_size, stat_spacing,
+                    font_path, username_font_size):
     draw.rounded_rectangle([(x0, y0), (x0+CW, y0+CH)], radius=20, fill=(255,255,255,230))
 
-    # Load fonts
     uname_fnt = ImageFont.truetype(font_path, username_font_size)
-    title_fnt = ImageFont.truetype(font_path, title_font_size)
-    stat_fnt  = ImageFont.truetype(font_path, stat_font_size)
 
     # Draw avatar
     text_x = x0 + padding
@@ -93,6 +65,18 @@ def create_story_card(
                 except Exception as e:
                     print(f"Warning: could not load reward icon '{p}': {e}", file=sys.stderr)
 
+    # Heart icon sits at a fixed spot in the stats row
+    if heart_icon is not None:
+        base.paste(heart_icon, (x0 + padding, y0 + CH - padding - stat_icon_size), heart_icon)
+
+# Per-post part of the card: title and stat counts drawn with `fill`.
+# Returns where the comment icon goes, since it shifts with the like count width.
+def _draw_card_text(draw, title, like_count, comment_count, fill, x0, y0, CW, CH, padding, avatar_size,
+                    stat_icon_size, stat_spacing, stat_text_padding,
+                    font_path, title_font_size, stat_font_size):
+    title_fnt = ImageFont.truetype(font_path, title_font_size)
+    stat_fnt  = ImageFont.truetype(font_path, stat_font_size)
+
     # Draw title text with adaptive scaling to fill space
     title_x = x0 + padding
     title_y = y0 + padding + avatar_size + padding//2
@@ -129,32 +113,194 @@ def create_story_card(
     cur_h = lh * len(lines)
     start_y = title_y + (max_text_h - cur_h)//2
     for i, line in enumerate(lines):
-        draw.text((title_x, start_y + i*lh), line, font=title_fnt, fill=(0,0,0,255))
+        draw.text((title_x, start_y + i*lh), line, font=title_fnt, fill=fill)
 
     # Draw bottom stats
     stats_y = y0 + CH - padding - stat_icon_size
-    sx = x0 + padding
-    if heart_icon_path and os.path.exists(heart_icon_path):
-        try:
-            heart = Image.open(heart_icon_path).convert("RGBA").resize((stat_icon_size,stat_icon_size), Image.LANCZOS)
-            base.paste(heart, (sx, stats_y), heart)
-        except Exception as e:
-            print(f"Warning: could not load heart icon '{heart_icon_path}': {e}", file=sys.stderr)
-    sx += stat_icon_size + stat_text_padding
+    sx = x0 + padding + stat_icon_size + stat_text_padding
     stat_h = draw.textbbox((0,0), "Ay", font=stat_fnt)[3] - draw.textbbox((0,0), "Ay", font=stat_fnt)[1]
     text_offset = (stat_h - stat_font_size)//2
-    draw.text((sx, stats_y + text_offset), like_count, font=stat_fnt, fill=(0,0,0,255))
+    draw.text((sx, stats_y + text_offset), like_count, font=stat_fnt, fill=fill)
     like_w = draw.textbbox((0,0), like_count, font=stat_fnt)[2]
     sx += like_w + stat_spacing*2
-    if comment_icon_path and os.path.exists(comment_icon_path):
-        try:
-            com = Image.open(comment_icon_path).convert("RGBA").resize((stat_icon_size,stat_icon_size), Image.LANCZOS)
-            base.paste(com, (sx, stats_y), com)
-        except Exception as e:
-            print(f"Warning: could not load comment icon '{comment_icon_path}': {e}", file=sys.stderr)
+    comment_pos = (sx, stats_y)
     sx += stat_icon_size + stat_text_padding
-    draw.text((sx, stats_y + text_offset), comment_count, font=stat_fnt, fill=(0,0,0,255))
+    draw.text((sx, stats_y + text_offset), comment_count, font=stat_fnt, fill=fill)
+    return comment_pos
+
+def create_story_card(
+    username: str,
+    title: str,
+    video_size=(1080, 1920),
+    card_size=(800, 600),
+    padding=30,
+    # Avatar / verified
+    avatar_path: str = None,
+    avatar_size=80,
+    is_verified: bool = False,
+    verified_icon_path: str = None,
+    verified_icon_size=40,
+    # Awards (gold/silver/etc)
+    reward_paths: list = None,
+    reward_size=40,
+    reward_spacing=10,
+    # Bottom stats
+    like_count: str = "0",
+    comment_count: str = "0",
+    heart_icon_path: str = None,
+    comment_icon_path: str = None,
+    stat_icon_size=30,
+    stat_spacing=10,
+    stat_text_padding=5,
+    # Fonts
+    font_path="arial.ttf",
+    username_font_size=50,
+    title_font_size=36,
+    stat_font_size=28,
+    # Output
+    output_path="story_card_full.png"
+):
+    W, H = video_size
+    CW, CH = card_size
+    x0 = (W - CW) // 2
+    y0 = (H - CH) // 4
+
+    # Create canvas + rounded white card
+    base = Image.new("RGBA", (W, H), (0,0,0,0))
+    draw = ImageDraw.Draw(base)
+    heart = _load_stat_icon(heart_icon_path, stat_icon_size, "heart")
+    _draw_card_base(base, draw, username, x0, y0, CW, CH, padding,
+                    avatar_path, avatar_size, is_verified, verified_icon_path, verified_icon_size,
+                    reward_paths, reward_size, reward_spacing, heart, stat_icon_size, stat_spacing,
+                    font_path, username_font_size)
+
+    comment_pos = _draw_card_text(draw, title, like_count, comment_count, (0,0,0,255), x0, y0, CW, CH, padding,
+                                  avatar_size, stat_icon_size, stat_spacing, stat_text_padding,
+                                  font_path, title_font_size, stat_font_size)
+    com = _load_stat_icon(comment_icon_path, stat_icon_size, "comment")
+    if com is not None:
+        base.paste(com, comment_pos, com)
 
     # Save PNG
     base.save(output_path)
-    return base
\ No newline at end of file
+    return base
+
+def _save_card_png(card, offset, video_size, path, compress_level):
+    # PNGs keep the full-canvas layout of create_story_card
+    W, H = video_size
+    x, y = offset
+    canvas = np.zeros((H, W, 4), dtype=np.uint8)
+    canvas[y:y+card.shape[0], x:x+card.shape[1]] = card
+    Image.fromarray(canvas, "RGBA").save(path, compress_level=compress_level)
+
+def create_story_cards(
+    username: str,
+    titles: list,
+    like_counts: list = None,
+    comment_counts: list = None,
+    video_size=(1080, 1920),
+    card_size=(800, 600),
+    padding=30,
+    avatar_path: str = None,
+    avatar_size=80,
+    is_verified: bool = False,
+    verified_icon_path: str = None,
+    verified_icon_size=40,
+    reward_paths: list = None,
+    reward_size=40,
+    reward_spacing=10,
+    heart_icon_path: str = None,
+    comment_icon_path: str = None,
+    stat_icon_size=30,
+    stat_spacing=10,
+    stat_text_padding=5,
+    font_path="arial.ttf",
+    username_font_size=50,
+    title_font_size=36,
+    stat_font_size=28,
+    # Output: PNGs are only written when paths are given
+    output_paths: list = None,
+    compress_level=1,
+    workers: int = None,
+    chunk_size=8
+):
+    """
+    Batch version of create_story_card. Returns one (card, (x, y)) pair per title: a
+    uint8 RGBA array cropped to the card rectangle and its top-left offset on the
+    video_size canvas, ready to hand to ImageClip without a PNG round trip.
+
+    The static card (background, avatar, username, badges, heart icon) is drawn once.
+    Per-card title/stat text is rasterized to coverage masks on a thread pool and
+    composited over the static card with NumPy, chunk_size cards at a time so the
+    float temporaries stay bounded however long the batch is.
+    """
+    n = len(titles)
+    if n == 0:
+        return []
+    like_counts = like_counts or ["0"] * n
+    comment_counts = comment_counts or ["0"] * n
+    output_paths = output_paths or [None] * n
+    W, H = video_size
+    CW, CH = card_size
+    x0 = (W - CW) // 2
+    y0 = (H - CH) // 4
+
+    base = Image.new("RGBA", (W, H), (0,0,0,0))
+    draw = ImageDraw.Draw(base)
+    heart = _load_stat_icon(heart_icon_path, stat_icon_size, "heart")
+    _draw_card_base(base, draw, username, x0, y0, CW, CH, padding,
+                    avatar_path, avatar_size, is_verified, verified_icon_path, verified_icon_size,
+                    reward_paths, reward_size, reward_spacing, heart, stat_icon_size, stat_spacing,
+                    font_path, username_font_size)
+    com = _load_stat_icon(comment_icon_path, stat_icon_size, "comment")
+
+    # Everything drawn lives inside the card rectangle (inclusive edges)
+    RW, RH = CW + 1, CH + 1
+    static = np.asarray(base)[y0:y0+RH, x0:x0+RW].astype(np.float32)
+    ink = np.array([0, 0, 0, 255], dtype=np.float32)
+    ink_delta = (ink - static) / 255.0
+    if com is not None:
+        icon = np.asarray(com).astype(np.float32)
+        icon_a = icon[..., 3:] / 255.0
+        ih, iw = icon.shape[:2]
+
+    # Layout is relative to the card origin, so text is drawn straight into a card-sized mask
+    def text_mask(i):
+        mask = Image.new("L", (RW, RH), 0)
+        pos = _draw_card_text(ImageDraw.Draw(mask), titles[i], like_counts[i], comment_counts[i], 255,
+                              0, 0, CW, CH, padding, avatar_size, stat_icon_size, stat_spacing,
+                              stat_text_padding, font_path, title_font_size, stat_font_size)
+        return np.asarray(mask), pos
+
+    cards = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, n, chunk_size):
+            idxs = range(start, min(start + chunk_size, n))
+            results = list(pool.map(text_mask, idxs))
+
+            # Composite black text over the static card for the whole chunk:
+            # static*(1-cov) + ink*cov, rewritten as static + (ink-static)*cov in one buffer
+            blend = np.stack([m for m, _ in results]).astype(np.float32)[..., None]
+            blend = blend * ink_delta
+            blend += static
+            chunk = np.rint(blend, out=blend).astype(np.uint8)
+            del blend
+
+            chunk_cards = []
+            for card, (_, (cx, cy)) in zip(chunk, results):
+                # copy so each card owns its memory instead of pinning the chunk
+                card = card.copy()
+                # The comment icon moves with the like count, so it is pasted per card
+                if com is not None:
+                    dst = card[cy:cy+ih, cx:cx+iw].astype(np.float32)
+                    out_rgb = icon[..., :3] * icon_a + dst[..., :3] * (1.0 - icon_a)
+                    out_a = icon[..., 3:] * icon_a + dst[..., 3:] * (1.0 - icon_a)
+                    card[cy:cy+ih, cx:cx+iw] = np.rint(np.concatenate([out_rgb, out_a], axis=-1))
+                chunk_cards.append(card)
+            del chunk
+
+            saves = [(card, i) for card, i in zip(chunk_cards, idxs) if output_paths[i]]
+            list(pool.map(lambda item: _save_card_png(item[0], (x0, y0), video_size,
+                                                      output_paths[item[1]], compress_level), saves))
+            cards.extend((card, (x0, y0)) for card in chunk_cards)
+    return cards
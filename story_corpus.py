@@ -0,0 +1,153 @@
+"""
+story_corpus.py
+
+Local SQLite corpus of fetched Reddit stories with full-text search and
+MinHash/LSH near-duplicate detection, so reposts are dropped before we pay for
+Polly and a render.
+
+Each story gets a MinHash signature over word shingles. Signatures are split into
+LSH bands whose hashes are stored in an indexed table, so a lookup touches only
+the handful of stories sharing a band bucket no matter how large the corpus grows.
+"""
+import re
+import sqlite3
+import hashlib
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 32
+SHINGLE_SIZE = 5
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+# Fixed seed keeps signatures comparable across runs and machines
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, MAX_HASH, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, MAX_HASH, size=NUM_PERM, dtype=np.uint64)
+
+
+def _shingles(text: str):
+    tokens = re.findall(r"[a-z0-9']+", text.lower())
+    if len(tokens) < SHINGLE_SIZE:
+        return {' '.join(tokens)}
+    return {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little')
+         for s in _shingles(text)),
+        dtype=np.uint64
+    )
+    # (a*x + b) mod p over all shingles and permutations at once; a, x < 2^32 so no overflow
+    phv = (np.outer(hashes, _PERM_A) + _PERM_B) % MERSENNE_PRIME & MAX_HASH
+    return phv.min(axis=0).astype(np.uint32)
+
+
+def _band_keys(sig: np.ndarray):
+    rows = NUM_PERM // BANDS
+    for band in range(BANDS):
+        chunk = sig[band * rows:(band + 1) * rows].tobytes()
+        yield band, int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'little', signed=True)
+
+
+class StoryCorpus:
+    def __init__(self, path: str = 'story_corpus.db', threshold: float = 0.8):
+        self.threshold = threshold
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS stories (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                subreddit TEXT,
+                title TEXT,
+                selftext TEXT,
+                score INTEGER,
+                used INTEGER NOT NULL DEFAULT 0,
+                signature BLOB NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5(title, selftext);
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                story INTEGER NOT NULL,
+                PRIMARY KEY (band, bucket, story)
+            ) WITHOUT ROWID;
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    # Insert or refresh a fetched submission (keeps its used flag)
+    def add(self, post_id: str, subreddit: str, title: str, selftext: str, score: int):
+        sig = minhash_signature(title + '\n' + (selftext or ''))
+        with self.conn:
+            row = self.conn.execute('SELECT rowid FROM stories WHERE id = ?', (post_id,)).fetchone()
+            if row:
+                rowid = row[0]
+                self.conn.execute(
+                    'UPDATE stories SET subreddit = ?, title = ?, selftext = ?, score = ?, signature = ? WHERE rowid = ?',
+                    (subreddit, title, selftext, score, sig.tobytes(), rowid)
+                )
+                self.conn.execute('DELETE FROM stories_fts WHERE rowid = ?', (rowid,))
+                self.conn.execute('DELETE FROM lsh_buckets WHERE story = ?', (rowid,))
+            else:
+                rowid = self.conn.execute(
+                    'INSERT INTO stories (id, subreddit, title, selftext, score, signature) VALUES (?, ?, ?, ?, ?, ?)',
+                    (post_id, subreddit, title, selftext, score, sig.tobytes())
+                ).lastrowid
+            self.conn.execute('INSERT INTO stories_fts (rowid, title, selftext) VALUES (?, ?, ?)',
+                              (rowid, title, selftext))
+            self.conn.executemany('INSERT INTO lsh_buckets (band, bucket, story) VALUES (?, ?, ?)',
+                                  [(band, key, rowid) for band, key in _band_keys(sig)])
+
+    def mark_used(self, post_id: str):
+        with self.conn:
+            self.conn.execute('UPDATE stories SET used = 1 WHERE id = ?', (post_id,))
+
+    # Ids from `post_ids` that are not stored yet
+    def missing_ids(self, post_ids):
+        known = set()
+        post_ids = list(post_ids)
+        for i in range(0, len(post_ids), 500):
+            chunk = post_ids[i:i + 500]
+            known.update(r[0] for r in self.conn.execute(
+                f"SELECT id FROM stories WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        return [p for p in post_ids if p not in known]
+
+    # Return the id of a near-duplicate story that was already used (or is listed in
+    # `selected`, e.g. picked earlier in the same run), else None
+    def find_duplicate(self, post_id: str, title: str, selftext: str, selected=()):
+        sig = minhash_signature(title + '\n' + (selftext or ''))
+        keys = list(_band_keys(sig))
+        clause = ' OR '.join(['(b.band = ? AND b.bucket = ?)'] * len(keys))
+        params = [v for key in keys for v in key]
+        selected = list(selected)
+        in_selected = f" OR s.id IN ({','.join('?' * len(selected))})" if selected else ''
+        rows = self.conn.execute(
+            f'SELECT DISTINCT s.id, s.signature FROM lsh_buckets b JOIN stories s ON s.rowid = b.story '
+            f'WHERE ({clause}) AND (s.used = 1{in_selected}) AND s.id != ?',
+            params + selected + [post_id]
+        ).fetchall()
+        best_id, best_sim = None, self.threshold
+        for cand_id, blob in rows:
+            sim = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == sig))
+            if sim >= best_sim:
+                best_id, best_sim = cand_id, sim
+        return best_id
+
+    # Full-text search over stored titles and bodies, best matches first.
+    # `query` is plain text: every word must match, FTS5 operators are not interpreted.
+    def search(self, query: str, limit: int = 20):
+        tokens = re.findall(r'\w+', query)
+        if not tokens:
+            return []
+        query = ' '.join(f'"{t}"' for t in tokens)
+        return self.conn.execute(
+            'SELECT s.id, s.subreddit, s.title, s.score FROM stories_fts f JOIN stories s ON s.rowid = f.rowid '
+            'WHERE stories_fts MATCH ? ORDER BY f.rank LIMIT ?',
+            (query, limit)
+        ).fetchall()